@@ -7,14 +7,36 @@
 
 import os
 import sys
+import re
 import json
 import shutil
-import sqlite3
 import subprocess
+import tempfile
 import glob
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from operator import itemgetter
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Tuple
+
+try:
+    import sqlcipher3
+    SQLCIPHER_AVAILABLE = True
+except ImportError:
+    SQLCIPHER_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
 
 # 颜色输出
 class Colors:
@@ -76,7 +98,11 @@ def get_wechat_path() -> Optional[Path]:
     print_info("发现多个用户目录:")
     for i, d in enumerate(user_dirs):
         msg_path = d / "Message"
-        db_count = len(list(msg_path.glob("msg_*.db"))) if msg_path.exists() else 0
+        try:
+            with os.scandir(msg_path) as entries:
+                db_count = sum(1 for e in entries if e.name.startswith('msg_') and e.name.endswith('.db'))
+        except FileNotFoundError:
+            db_count = 0
         print(f"  [{i+1}] {d.name[:8]}... ({db_count} 个数据库文件)")
     
     while True:
@@ -107,16 +133,12 @@ def find_db_files(wechat_path: Path) -> List[Path]:
 
 def check_sqlcipher() -> bool:
     """检查sqlcipher是否安装"""
-    try:
-        result = subprocess.run(["which", "sqlcipher"], capture_output=True, text=True)
-        if result.returncode == 0:
-            print_success("sqlcipher 已安装")
-            return True
-    except:
-        pass
+    if SQLCIPHER_AVAILABLE:
+        print_success("sqlcipher 已安装")
+        return True
     
     print_error("sqlcipher 未安装")
-    print_info("请运行: brew install sqlcipher")
+    print_info("请运行: brew install sqlcipher && pip3 install sqlcipher3")
     return False
 
 def check_sip_status() -> bool:
@@ -133,39 +155,88 @@ def check_sip_status() -> bool:
         print_warning("无法检查SIP状态")
         return False
 
+def find_wechat_pid() -> Optional[int]:
+    """查找微信进程ID"""
+    if PSUTIL_AVAILABLE:
+        return next((p.pid for p in psutil.process_iter(['name']) if p.info['name'] == 'WeChat'), None)
+    
+    result = subprocess.run(["pgrep", "-x", "WeChat"], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return int(result.stdout.split()[0])
+
 def get_key_from_lldb() -> Optional[str]:
     """使用lldb从微信进程获取密钥"""
     print_header("从微信进程提取密钥")
     
     # 检查微信是否运行
-    result = subprocess.run(["pgrep", "WeChat"], capture_output=True, text=True)
-    if result.returncode != 0:
+    pid = find_wechat_pid()
+    if pid is None:
         print_error("微信未运行，请先启动微信并登录")
         return None
     
-    pid = result.stdout.strip().split('\n')[0]
     print_info(f"微信进程ID: {pid}")
     
+    # sqlite3_key 的密钥指针是第二个参数，$arg2 按微信进程的架构对应 x1 或 rsi
+    # (不能按 Python 的架构判断: Rosetta 下的 Python 与原生微信架构不同)
+    lldb_commands = [
+        "br set -n sqlite3_key",
+        "c",
+        "memory read --size 1 --format x --count 32 $arg2",
+        "process detach",
+    ]
+    
     print_warning("需要sudo权限来附加到微信进程")
-    print_info("即将执行lldb，请按照提示操作...")
-    print()
-    print(f"{Colors.CYAN}操作步骤:{Colors.END}")
-    print("  1. lldb附加后，输入: br set -n sqlite3_key")
-    print("  2. 输入: c (继续执行)")
-    print("  3. 在微信中切换聊天或刷新触发断点")
-    print("  4. 断点触发后，输入: memory read --size 1 --format x --count 32 $rsi")
-    print("     (M1/M2芯片使用 $x1 替代 $rsi)")
-    print("  5. 复制输出的32字节十六进制密钥")
-    print("  6. 输入: quit 退出lldb")
+    print_info("lldb附加后，请在微信中切换聊天或刷新以触发断点")
     print()
     
     input("按Enter键开始...")
     
-    # 启动lldb
-    os.system(f"sudo lldb -p {pid}")
+    # 以批处理方式运行lldb并捕获输出
+    with tempfile.NamedTemporaryFile('w', suffix='.lldb', delete=False) as f:
+        f.write('\n'.join(lldb_commands) + '\n')
+        command_file = f.name
     
-    # 手动输入密钥
+    print_info(f"正在等待断点触发（最长 {LLDB_TIMEOUT} 秒），请在微信中切换聊天或刷新；按 Ctrl+C 可改为手动输入")
+    
+    # stdin 不接终端: lldb 意外进入交互模式时读到 EOF 直接退出，sudo 仍从 /dev/tty 读取密码
+    output = ''
+    try:
+        proc = subprocess.Popen(
+            ["sudo", "lldb", "-p", str(pid), "--batch", "-s", command_file],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+        try:
+            output, _ = proc.communicate(timeout=LLDB_TIMEOUT)
+        except (subprocess.TimeoutExpired, KeyboardInterrupt):
+            print()
+            print_warning("等待断点超时或已取消")
+            # sudo 会把 SIGTERM 转发给 lldb，使其退出并脱离微信进程
+            proc.terminate()
+            try:
+                output, _ = proc.communicate(timeout=5)
+            except subprocess.TimeoutExpired:
+                # 子进程可能仍占用管道，只回收 sudo 本身
+                proc.kill()
+                proc.wait()
+    finally:
+        os.remove(command_file)
+    
+    # 只解析 memory read 输出的内存行，避免命令回显和日志中的字符被误认为密钥
+    dump = '\n'.join(line for line in (output or '').splitlines() if MEMORY_LINE_PATTERN.match(line))
+    if dump:
+        key = parse_hex_key(dump)
+        if key:
+            print_success(f"密钥读取成功: {key[:16]}...")
+            return key
+    
+    # 自动读取失败时手动输入
     print()
+    print_warning("未能从lldb输出中读取密钥")
+    print_info("可手动执行 lldb 并运行: memory read --size 1 --format x --count 32 $arg2")
     print_info("请粘贴从lldb获取的密钥（32字节十六进制，如 0xe5 0x16 ...）:")
     key_input = input().strip()
     
@@ -178,237 +249,274 @@ def get_key_from_lldb() -> Optional[str]:
         print_success(f"密钥解析成功: {key[:16]}...")
     return key
 
+# 等待 lldb 断点触发的最长秒数
+LLDB_TIMEOUT = 120
+
+# lldb memory read 的输出行，如 0x600000d0c000: 0xe5 0x16 ...
+MEMORY_LINE_PATTERN = re.compile(r'\s*0x[0-9a-fA-F]+:\s')
+
+# 以空白或逗号分隔的单字节十六进制值，如 0xe5 或 e5
+HEX_BYTE_PATTERN = re.compile(r'(?<![^\s,])(?:0x)?([0-9a-fA-F]{2})(?![^\s,])')
+
 def parse_hex_key(hex_string: str) -> Optional[str]:
     """解析十六进制密钥字符串"""
-    try:
-        # 移除地址前缀和其他非十六进制内容
-        parts = hex_string.replace('0x', ' ').replace(',', ' ').split()
-        hex_bytes = []
-        
-        for part in parts:
-            part = part.strip()
-            if len(part) == 2 and all(c in '0123456789abcdefABCDEF' for c in part):
-                hex_bytes.append(part)
-        
-        if len(hex_bytes) >= 32:
-            hex_bytes = hex_bytes[:32]
-            return '0x' + ''.join(hex_bytes)
-        
-        print_error(f"密钥长度不足，需要32字节，当前{len(hex_bytes)}字节")
-        return None
-    except Exception as e:
-        print_error(f"密钥解析失败: {e}")
-        return None
+    # 地址前缀等非单字节内容不会被匹配
+    hex_bytes = HEX_BYTE_PATTERN.findall(hex_string)
+    
+    if len(hex_bytes) >= 32:
+        return '0x' + bytes.fromhex(''.join(hex_bytes[:32])).hex()
+    
+    print_error(f"密钥长度不足，需要32字节，当前{len(hex_bytes)}字节")
+    return None
+
+# 读取消息表时每批获取的行数
+FETCH_BATCH_SIZE = 10000
+
+# 并行读取数据库的最大线程数
+MAX_WORKERS = 8
+
+# 单条 UNION ALL 语句合并的分表数量 (SQLite 默认复合查询上限为 500)
+MAX_UNION_SELECTS = 500
+
+# sqlcipher 参数组合，按顺序尝试
+CIPHER_PRAGMAS = [
+    ["PRAGMA cipher_compatibility = 4"],
+    [
+        "PRAGMA cipher_page_size = 4096",
+        "PRAGMA kdf_iter = 64000",
+        "PRAGMA cipher_hmac_algorithm = HMAC_SHA1",
+        "PRAGMA cipher_kdf_algorithm = PBKDF2_HMAC_SHA1",
+    ],
+]
+
+# 原始数据库仍被微信使用，只调整不改动文件的读取参数
+READ_PRAGMAS = [
+    "PRAGMA cache_size = -262144",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 1073741824",
+]
+
+# parse_hex_key 输出的 32 字节原始密钥
+RAW_KEY_PATTERN = re.compile(r'0x([0-9a-fA-F]{64})')
 
-def decrypt_database(db_path: Path, key: str, output_dir: Path) -> Optional[Path]:
-    """解密单个数据库文件"""
-    output_path = output_dir / f"{db_path.stem}_decrypted.db"
+def build_key_pragma(key: str) -> str:
+    """生成 PRAGMA key 语句
+    
+    32 字节原始密钥以 x'...' 形式传入，sqlcipher 会直接使用而跳过 PBKDF2 派生；
+    其他输入按口令处理
+    """
+    match = RAW_KEY_PATTERN.fullmatch(key)
+    if match:
+        return f"PRAGMA key = \"x'{match.group(1)}'\""
+    
+    escaped = key.replace('"', '""')
+    return f'PRAGMA key = "{escaped}"'
+
+def open_encrypted_db(db_path: Path, key: str):
+    """以只读方式直接打开加密数据库，密钥不匹配时返回None"""
+    uri = f"{db_path.resolve().as_uri()}?mode=ro"
+    key_pragma = build_key_pragma(key)
     
-    try:
-        # 使用sqlcipher解密
-        commands = f'''
-PRAGMA key = "{key}";
-PRAGMA cipher_compatibility = 4;
-ATTACH DATABASE '{output_path}' AS plaintext KEY '';
-SELECT sqlcipher_export('plaintext');
-DETACH DATABASE plaintext;
-'''
-        
-        result = subprocess.run(
-            ["sqlcipher", str(db_path)],
-            input=commands,
-            capture_output=True,
-            text=True
-        )
+    for pragmas in CIPHER_PRAGMAS:
+        try:
+            conn = sqlcipher3.connect(uri, uri=True)
+        except sqlcipher3.Error as e:
+            # 文件无权限或已被删除时无法打开
+            print_error(f"无法打开数据库 {db_path.name}: {e}")
+            return None
         
-        if output_path.exists() and output_path.stat().st_size > 0:
-            return output_path
-        else:
+        try:
+            conn.execute(key_pragma)
+            for pragma in pragmas:
+                conn.execute(pragma)
+            # 密钥或参数不匹配时此处抛出 DatabaseError
+            conn.execute("SELECT count(*) FROM sqlite_master")
+        except sqlcipher3.DatabaseError:
             # 尝试另一种方式
-            commands2 = f'''
-PRAGMA key = "{key}";
-PRAGMA cipher_page_size = 4096;
-PRAGMA kdf_iter = 64000;
-PRAGMA cipher_hmac_algorithm = HMAC_SHA1;
-PRAGMA cipher_kdf_algorithm = PBKDF2_HMAC_SHA1;
-ATTACH DATABASE '{output_path}' AS plaintext KEY '';
-SELECT sqlcipher_export('plaintext');
-DETACH DATABASE plaintext;
-'''
-            result = subprocess.run(
-                ["sqlcipher", str(db_path)],
-                input=commands2,
-                capture_output=True,
-                text=True
-            )
-            
-            if output_path.exists() and output_path.stat().st_size > 0:
-                return output_path
-                
-        return None
-    except Exception as e:
-        print_error(f"解密失败: {e}")
+            conn.close()
+            continue
+        
+        for pragma in READ_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    return None
+
+def resolve_message_columns(cursor, table: str) -> Optional[str]:
+    """解析消息表字段，返回固定顺序的查询列；没有内容字段时返回None"""
+    # 获取表结构
+    cursor.execute(f"PRAGMA table_info({table})")
+    columns = {row[1].lower(): row[1] for row in cursor.fetchall()}
+    
+    # 常见的消息字段映射
+    content_col = columns.get('strcontent') or columns.get('content') or columns.get('message')
+    time_col = columns.get('createtime') or columns.get('time') or columns.get('timestamp')
+    sender_col = columns.get('strtalker') or columns.get('talker') or columns.get('sender')
+    type_col = columns.get('type') or columns.get('msgtype')
+    issend_col = columns.get('issend') or columns.get('is_send')
+    
+    if not content_col:
         return None
+    
+    # 缺失的列用 NULL 占位以保持固定的列顺序
+    return ', '.join(col or 'NULL' for col in (content_col, time_col, sender_col, type_col, issend_col))
+
+def fetch_rows(cursor, sql: str, rows_out: List[Tuple]):
+    """执行查询并分批读取全部结果"""
+    cursor.execute(sql)
+    while True:
+        rows = cursor.fetchmany()
+        if not rows:
+            break
+        rows_out.extend(rows)
 
-def extract_messages(db_path: Path) -> List[Dict[str, Any]]:
-    """从解密的数据库中提取消息"""
-    messages = []
+def extract_messages(cursor, tables: List[Tuple[str, str]], groups: Dict[str, List[Tuple]]):
+    """提取消息，按会话追加 (content, timestamp, sender, type, isSend) 元组，缺失的字段为 None"""
+    cursor.arraysize = FETCH_BATCH_SIZE
     
-    try:
-        conn = sqlite3.connect(str(db_path))
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # 获取所有表名
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = [row[0] for row in cursor.fetchall()]
-        
-        # 查找消息表 (通常是 MSG 或 Chat_xxx)
-        msg_tables = [t for t in tables if 'MSG' in t.upper() or 'CHAT' in t.upper()]
-        
-        for table in msg_tables:
-            try:
-                # 获取表结构
-                cursor.execute(f"PRAGMA table_info({table})")
-                columns = {row[1].lower(): row[1] for row in cursor.fetchall()}
-                
-                # 常见的消息字段映射
-                content_col = columns.get('strcontent') or columns.get('content') or columns.get('message')
-                time_col = columns.get('createtime') or columns.get('time') or columns.get('timestamp')
-                sender_col = columns.get('strtalker') or columns.get('talker') or columns.get('sender')
-                type_col = columns.get('type') or columns.get('msgtype')
-                issend_col = columns.get('issend') or columns.get('is_send')
-                
-                if not content_col:
-                    continue
-                
-                # 构建查询
-                select_cols = [content_col]
-                if time_col: select_cols.append(time_col)
-                if sender_col: select_cols.append(sender_col)
-                if type_col: select_cols.append(type_col)
-                if issend_col: select_cols.append(issend_col)
-                
-                query = f"SELECT {', '.join(select_cols)} FROM {table}"
-                cursor.execute(query)
-                
-                for row in cursor.fetchall():
-                    msg = {
-                        'content': row[0] if row[0] else '',
-                        'table': table
-                    }
-                    
-                    idx = 1
-                    if time_col:
-                        msg['timestamp'] = row[idx]
-                        idx += 1
-                    if sender_col:
-                        msg['sender'] = row[idx]
-                        idx += 1
-                    if type_col:
-                        msg['type'] = row[idx]
-                        idx += 1
-                    if issend_col:
-                        msg['isSelf'] = row[idx] == 1
-                        idx += 1
-                    
-                    if msg['content']:
-                        messages.append(msg)
-                        
-            except Exception as e:
-                continue
-        
-        conn.close()
-    except Exception as e:
-        print_error(f"读取数据库失败: {e}")
+    # 查找消息表 (通常是 MSG 或 Chat_xxx)
+    msg_tables = [(t, sql) for t, sql in tables if 'MSG' in t.upper() or 'CHAT' in t.upper()]
+    
+    # 分表结构通常相同，按去掉表名后的建表语句缓存字段映射
+    select_cols_cache = {}
+    selects = []
     
-    return messages
+    for table, sql in msg_tables:
+        try:
+            signature = (sql or '').replace(table, '', 1)
+            if signature not in select_cols_cache:
+                select_cols_cache[signature] = resolve_message_columns(cursor, table)
+            
+            select_cols = select_cols_cache[signature]
+            if select_cols:
+                selects.append(f"SELECT {select_cols} FROM {table}")
+        except Exception:
+            continue
+    
+    # 用 UNION ALL 合并各分表查询，每条语句不超过 SQLite 的复合查询上限
+    for i in range(0, len(selects), MAX_UNION_SELECTS):
+        batch = selects[i:i + MAX_UNION_SELECTS]
+        rows = []
+        try:
+            fetch_rows(cursor, " UNION ALL ".join(batch), rows)
+        except Exception:
+            # 任一分表出错时整条语句作废，退回逐表查询并只跳过出错的表
+            rows = []
+            for select in batch:
+                start = len(rows)
+                try:
+                    fetch_rows(cursor, select, rows)
+                except Exception:
+                    del rows[start:]
+        
+        # 按会话分组
+        for row in rows:
+            if row[0]:
+                groups[row[2] or 'unknown'].append(row)
+
+# 联系人表及对应的查询，按顺序尝试
+CONTACT_QUERIES = [
+    ('WCContact', "SELECT userName, nickName FROM WCContact"),
+    ('Friend', "SELECT username, nickname FROM Friend"),
+]
 
-def extract_contacts(db_path: Path) -> Dict[str, str]:
+def extract_contacts(cursor, tables: List[Tuple[str, str]], contacts: Dict[str, str]):
     """提取联系人信息"""
+    # 按实际存在的表结构读取
+    table_names = {t for t, _ in tables}
+    
+    # 各表独立查询，字段不符时只跳过该表
+    for table, query in CONTACT_QUERIES:
+        if table not in table_names:
+            continue
+        try:
+            cursor.execute(query)
+            contacts.update({u: n for u, n in cursor if u and n})
+        except sqlcipher3.Error:
+            continue
+
+def process_database(db_path: Path, key: str) -> Optional[Tuple[Dict[str, str], Dict[str, List[Tuple]]]]:
+    """解密并一次性读出单个数据库的联系人和按会话分组的消息，无法解密时返回None"""
+    conn = open_encrypted_db(db_path, key)
+    if conn is None:
+        return None
+    
     contacts = {}
+    groups = defaultdict(list)
     
     try:
-        conn = sqlite3.connect(str(db_path))
         cursor = conn.cursor()
         
-        # 尝试不同的表结构
-        try:
-            cursor.execute("SELECT userName, nickName FROM WCContact")
-            for row in cursor.fetchall():
-                if row[0] and row[1]:
-                    contacts[row[0]] = row[1]
-        except:
-            pass
+        # 获取所有表名及建表语句
+        cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='table'")
+        tables = cursor.fetchall()
         
-        try:
-            cursor.execute("SELECT username, nickname FROM Friend")
-            for row in cursor.fetchall():
-                if row[0] and row[1]:
-                    contacts[row[0]] = row[1]
-        except:
-            pass
-            
+        if 'contact' in db_path.name.lower():
+            extract_contacts(cursor, tables, contacts)
+        else:
+            extract_messages(cursor, tables, groups)
+    except Exception as e:
+        print_error(f"读取数据库失败: {e}")
+    finally:
         conn.close()
-    except:
-        pass
     
-    return contacts
+    return contacts, groups
 
-def export_to_json(messages: List[Dict], contacts: Dict, output_path: Path):
+# 消息类型代码到导出类型的映射
+MESSAGE_TYPES = {
+    1: 'text',
+    3: 'image',
+    34: 'voice',
+    43: 'video',
+    47: 'emoji',
+    49: 'file',
+    10000: 'system',
+    10002: 'system'
+}
+
+def export_to_json(groups: Dict[str, List[Tuple]], contacts: Dict, output_path: Path):
     """导出为JSON格式"""
-    # 按会话分组
-    sessions = {}
-    
-    for msg in messages:
-        sender = msg.get('sender', 'unknown')
-        if sender not in sessions:
-            sessions[sender] = {
-                'id': sender,
-                'name': contacts.get(sender, sender),
-                'messages': [],
-                'isGroup': '@chatroom' in sender
-            }
-        
-        sessions[sender]['messages'].append({
-            'id': str(len(sessions[sender]['messages'])),
-            'content': msg.get('content', ''),
-            'timestamp': msg.get('timestamp', 0) * 1000 if msg.get('timestamp') else 0,
-            'isSelf': msg.get('isSelf', False),
-            'senderName': '我' if msg.get('isSelf') else contacts.get(sender, sender),
-            'type': get_message_type(msg.get('type', 1))
-        })
+    message_type = MESSAGE_TYPES.get
     
     # 转换为列表并排序
-    result = list(sessions.values())
-    for session in result:
-        session['messages'].sort(key=lambda x: x['timestamp'])
-        session['messageCount'] = len(session['messages'])
-        if session['messages']:
-            session['lastMessage'] = session['messages'][-1]['content'][:50]
-            session['lastMessageTime'] = session['messages'][-1]['timestamp']
+    result = []
+    for sender, msgs in groups.items():
+        name = contacts.get(sender, sender)
+        session_messages = []
+        
+        for i, (content, timestamp, _, type_code, is_send) in enumerate(msgs):
+            is_self = is_send == 1
+            session_messages.append({
+                'id': str(i),
+                'content': content,
+                'timestamp': timestamp * 1000 if timestamp else 0,
+                'isSelf': is_self,
+                'senderName': '我' if is_self else name,
+                'type': message_type(type_code, 'text')
+            })
+        
+        session_messages.sort(key=itemgetter('timestamp'))
+        result.append({
+            'id': sender,
+            'name': name,
+            'messages': session_messages,
+            'isGroup': '@chatroom' in sender,
+            'messageCount': len(session_messages),
+            'lastMessage': session_messages[-1]['content'][:50],
+            'lastMessageTime': session_messages[-1]['timestamp']
+        })
     
-    result.sort(key=lambda x: x.get('lastMessageTime', 0), reverse=True)
+    result.sort(key=itemgetter('lastMessageTime'), reverse=True)
     
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
+    if ORJSON_AVAILABLE:
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
     
     return len(result), sum(s['messageCount'] for s in result)
 
-def get_message_type(type_code) -> str:
-    """转换消息类型"""
-    type_map = {
-        1: 'text',
-        3: 'image',
-        34: 'voice',
-        43: 'video',
-        47: 'emoji',
-        49: 'file',
-        10000: 'system',
-        10002: 'system'
-    }
-    return type_map.get(type_code, 'text')
-
 def manual_key_input() -> Optional[str]:
     """手动输入密钥"""
     print_header("手动输入密钥")
@@ -494,39 +602,49 @@ def main():
     # 解密数据库
     print_header("解密数据库")
     
-    all_messages = []
+    groups = defaultdict(list)
     contacts = {}
+    db_results = {}
     decrypted_count = 0
     
-    for db_file in db_files:
-        print_info(f"解密: {db_file.name}")
-        
-        decrypted_path = decrypt_database(db_file, key, output_dir)
+    # 各数据库相互独立，并行读取；sqlite 在 C 层读取时释放 GIL，线程即可重叠 I/O
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(db_files))) as executor:
+        futures = {executor.submit(process_database, db_file, key): db_file for db_file in db_files}
         
-        if decrypted_path:
-            print_success(f"  → {decrypted_path.name}")
-            decrypted_count += 1
+        for future in as_completed(futures):
+            db_file = futures[future]
+            result = future.result()
             
-            # 提取数据
+            if result is None:
+                print_warning(f"解密失败，跳过: {db_file.name}")
+                continue
+            
+            decrypted_count += 1
+            db_contacts, db_groups = result
+            db_results[db_file] = result
             if 'contact' in db_file.name.lower():
-                contacts.update(extract_contacts(decrypted_path))
+                print_success(f"解密: {db_file.name}，提取 {len(db_contacts)} 个联系人")
             else:
-                messages = extract_messages(decrypted_path)
-                all_messages.extend(messages)
-                print_info(f"    提取 {len(messages)} 条消息")
-        else:
-            print_warning(f"  解密失败，跳过")
+                print_success(f"解密: {db_file.name}，提取 {sum(map(len, db_groups.values()))} 条消息")
+    
+    # 按数据库顺序合并，使导出结果与完成顺序无关
+    for db_file in db_files:
+        if db_file in db_results:
+            db_contacts, db_groups = db_results[db_file]
+            contacts.update(db_contacts)
+            for sender, msgs in db_groups.items():
+                groups[sender].extend(msgs)
     
     print()
     print_success(f"成功解密 {decrypted_count}/{len(db_files)} 个数据库")
     print_success(f"提取 {len(contacts)} 个联系人")
-    print_success(f"提取 {len(all_messages)} 条消息")
+    print_success(f"提取 {sum(map(len, groups.values()))} 条消息")
     
     # 导出JSON
-    if all_messages:
+    if groups:
         print_header("导出数据")
         json_path = output_dir / "chat_records.json"
-        session_count, msg_count = export_to_json(all_messages, contacts, json_path)
+        session_count, msg_count = export_to_json(groups, contacts, json_path)
         print_success(f"导出完成: {json_path}")
         print_info(f"  {session_count} 个会话, {msg_count} 条消息")
         print()
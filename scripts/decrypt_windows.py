@@ -10,10 +10,15 @@ import sys
 import json
 import ctypes
 import struct
+import hashlib
+import mmap
 import sqlite3
 import subprocess
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from itertools import repeat
+from operator import itemgetter
 from pathlib import Path
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Tuple
 
 # Windows specific imports
 try:
@@ -23,6 +28,12 @@ try:
 except ImportError:
     PYMEM_AVAILABLE = False
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # 颜色输出 (Windows)
 class Colors:
     HEADER = ''
@@ -78,6 +89,53 @@ VERSION_OFFSETS = {
     'default': {'key_offset': 0x25E4D98, 'base_name': 'WeChatWin.dll'},
 }
 
+# SQLCipher密钥派生参数
+KDF_ITER_COUNT = 64000
+SALT_SIZE = 16
+
+# 页面布局: 页首为 IV (首页为 salt，其后才是 IV)，页尾 MAC_SIZE 字节为 HMAC 区域
+PAGE_SIZE = 4096
+IV_SIZE = 16
+MAC_SIZE = 32
+SQLITE_HEADER = b'SQLite format 3\x00'
+
+# 解密时每批处理的页数
+DECRYPT_BATCH_PAGES = 256
+
+# 并行解密页面的总线程数，多个数据库同时解密时由各进程平分
+DECRYPT_WORKERS = os.cpu_count() or 1
+
+# SQLite 文件头第 21-23 字节 (payload 比例) 为固定值，用于校验首页是否解密正确
+SQLITE_HEADER_FRACTIONS = b'\x40\x20\x20'
+
+# 读取消息表时每批获取的行数
+FETCH_BATCH_SIZE = 10000
+
+# 单条 UNION ALL 语句合并的分表数量 (SQLite 默认复合查询上限为 500)
+MAX_UNION_SELECTS = 500
+
+# 解密副本只读不写，可放心关闭日志并加大缓存
+READ_PRAGMAS = [
+    "PRAGMA cache_size = -262144",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA journal_mode = OFF",
+]
+
+def get_file_save_path() -> Optional[Path]:
+    """从注册表读取微信文件保存位置，使用默认的文档目录时返回None"""
+    try:
+        import winreg
+        key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Software\Tencent\WeChat")
+        save_path, _ = winreg.QueryValueEx(key, "FileSavePath")
+        winreg.CloseKey(key)
+        # "MyDocument:" 表示默认的文档目录
+        if save_path and save_path != 'MyDocument:':
+            return Path(save_path) / 'WeChat Files'
+    except:
+        pass
+    return None
+
 def get_wechat_path() -> Optional[Path]:
     """获取微信数据目录"""
     # 常见路径
@@ -86,14 +144,23 @@ def get_wechat_path() -> Optional[Path]:
         Path('C:/Users') / os.environ.get('USERNAME', '') / 'Documents' / 'WeChat Files',
     ]
     
+    # 注册表中自定义的保存位置优先
+    save_path = get_file_save_path()
+    if save_path:
+        possible_paths.insert(0, save_path)
+    
     for base_path in possible_paths:
         if base_path.exists():
+            # 只枚举一次目录，scandir 的条目自带类型信息，无需逐个 stat
+            with os.scandir(base_path) as entries:
+                sub_dirs = sorted(Path(e.path) for e in entries if e.is_dir())
+            
             # 查找用户目录 (wxid_xxx 格式)
-            user_dirs = [d for d in base_path.iterdir() if d.is_dir() and d.name.startswith('wxid_')]
+            user_dirs = [d for d in sub_dirs if d.name.startswith('wxid_')]
             
             if not user_dirs:
                 # 尝试其他格式的用户目录
-                user_dirs = [d for d in base_path.iterdir() if d.is_dir() and (d / 'Msg').exists()]
+                user_dirs = [d for d in sub_dirs if (d / 'Msg').exists()]
             
             if user_dirs:
                 if len(user_dirs) == 1:
@@ -126,7 +193,12 @@ def find_db_files(wechat_path: Path) -> List[Path]:
         # 主消息数据库
         multi_path = msg_path / "Multi"
         if multi_path.exists():
-            db_files.extend(multi_path.glob("MSG*.db"))
+            # 与 glob 在 Windows 上一致，文件名不区分大小写
+            with os.scandir(multi_path) as entries:
+                for entry in entries:
+                    name = entry.name.upper()
+                    if name.startswith('MSG') and name.endswith('.DB'):
+                        db_files.append(Path(entry.path))
         
         # MicroMsg.db (联系人等)
         micro_msg = msg_path / "MicroMsg.db"
@@ -175,7 +247,7 @@ def get_key_from_memory() -> Optional[bytes]:
         offsets = VERSION_OFFSETS.get(version, VERSION_OFFSETS['default'])
         key_offset = offsets['key_offset']
         
-        # 读取密钥地址
+        # 读取密钥地址 (指针在模块数据段，密钥在堆上，地址未知前无法合并为一次读取)
         key_addr = pm.read_longlong(base_addr + key_offset)
         
         # 读取32字节密钥
@@ -212,101 +284,120 @@ def search_key_in_memory() -> Optional[bytes]:
     
     return None
 
-def decrypt_database(db_path: Path, key: bytes, output_dir: Path) -> Optional[Path]:
-    """解密数据库"""
+def read_salt(db_path: Path) -> bytes:
+    """读取数据库文件开头的salt"""
+    with open(db_path, 'rb') as f:
+        return f.read(SALT_SIZE)
+
+def derive_key(key: bytes, salt: bytes) -> bytes:
+    """由原始密钥和salt派生页面解密密钥"""
+    return hashlib.pbkdf2_hmac('sha1', key, salt, KDF_ITER_COUNT, 32)
+
+def decrypt_database(db_path: Path, derived_key: bytes, output_dir: Path, workers: int = DECRYPT_WORKERS) -> Optional[Path]:
+    """使用已派生的密钥解密数据库，workers 为解密线程数"""
     output_path = output_dir / f"{db_path.stem}_decrypted.db"
     
     try:
-        # 读取加密数据库
-        with open(db_path, 'rb') as f:
-            encrypted_data = f.read()
-        
-        # SQLCipher参数
-        page_size = 4096
-        iter_count = 64000
-        salt_size = 16
-        
-        # 获取salt
-        salt = encrypted_data[:salt_size]
-        
         # 导入解密库
         try:
-            from Crypto.Cipher import AES
-            from Crypto.Protocol.KDF import PBKDF2
-            from hashlib import sha1
-            import hmac
+            from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
         except ImportError:
-            print_error("请安装 pycryptodome: pip install pycryptodome")
+            print_error("请安装 cryptography: pip install cryptography")
             return None
         
-        # 派生密钥
-        derived_key = PBKDF2(key, salt, dkLen=32, count=iter_count, prf=lambda p, s: hmac.new(p, s, sha1).digest())
-        
-        # 解密数据
-        decrypted_data = bytearray()
-        
-        # 添加SQLite文件头
-        sqlite_header = b'SQLite format 3\x00'
-        
-        num_pages = len(encrypted_data) // page_size
-        
-        for page_num in range(num_pages):
-            offset = page_num * page_size
-            page_data = encrypted_data[offset:offset + page_size]
+        # 映射加密数据库并逐批解密写出，内存占用只与批大小有关
+        valid = True
+        with open(db_path, 'rb') as f_in, open(output_path, 'wb') as f_out:
+            num_pages = os.fstat(f_in.fileno()).st_size // PAGE_SIZE
             
-            if page_num == 0:
-                # 第一页特殊处理
-                iv = page_data[16:32]
-                encrypted_content = page_data[32:page_size - 32]
-                mac = page_data[page_size - 32:page_size - 12]
-            else:
-                iv = page_data[:16]
-                encrypted_content = page_data[16:page_size - 32]
-                mac = page_data[page_size - 32:page_size - 12]
-            
-            # AES解密
-            cipher = AES.new(derived_key, AES.MODE_CBC, iv)
-            try:
-                decrypted_page = cipher.decrypt(encrypted_content)
-                
-                if page_num == 0:
-                    decrypted_data.extend(sqlite_header)
-                    decrypted_data.extend(b'\x00' * (16 - len(sqlite_header)))
-                    decrypted_data.extend(decrypted_page)
-                else:
-                    decrypted_data.extend(iv)
-                    decrypted_data.extend(decrypted_page)
+            if num_pages:
+                with mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as encrypted_data:
+                    data_size = num_pages * PAGE_SIZE
+                    batch_size = DECRYPT_BATCH_PAGES * PAGE_SIZE
+                    mac_padding = bytes(MAC_SIZE)
+                    mac_start = PAGE_SIZE - MAC_SIZE
                     
-            except Exception:
-                # 解密失败，保留原始数据
-                decrypted_data.extend(page_data)
-        
-        # 写入解密后的数据
-        with open(output_path, 'wb') as f:
-            f.write(decrypted_data)
+                    # 首页正文前移 salt 长度后，末尾需要清零的范围
+                    first_body_end = mac_start - SALT_SIZE
+                    first_padding = bytes(PAGE_SIZE - first_body_end)
+                    
+                    # 整库共用一个 Cipher，各批只创建各自的解密上下文
+                    cipher = Cipher(algorithms.AES(derived_key), modes.CBC(bytes(IV_SIZE)))
+                    
+                    def decrypt_batch(batch_start: int, batch: bytearray) -> int:
+                        """解密一批页面到 batch 中，返回解密的字节数"""
+                        batch_end = min(batch_start + batch_size, data_size)
+                        
+                        # 每页正文紧跟在该页 IV 之后 (首页在 salt 之后)，CBC 解密每个分组只依赖前一个密文分组，
+                        # 因此每批页面可作为一条 CBC 流解密: 各页正文结果与逐页解密相同，IV/MAC 区域的结果丢弃。
+                        # 批的首个分组是 IV 或 salt，起始 IV 取任意值即可，各批互不依赖
+                        decryptor = cipher.decryptor()
+                        length = decryptor.update_into(encrypted_data[batch_start:batch_end], batch)
+                        
+                        # 各页保持原有偏移: 页首写回 IV，页尾的 MAC 区域清零
+                        for offset in range(0, length, PAGE_SIZE):
+                            batch[offset:offset + IV_SIZE] = encrypted_data[batch_start + offset:batch_start + offset + IV_SIZE]
+                            batch[offset + mac_start:offset + PAGE_SIZE] = mac_padding
+                        
+                        # 第一页特殊处理: 正文前移到文件头之后
+                        if batch_start == 0:
+                            batch[SALT_SIZE:first_body_end] = batch[SALT_SIZE + IV_SIZE:mac_start]
+                            batch[first_body_end:PAGE_SIZE] = first_padding
+                            batch[0:len(SQLITE_HEADER)] = SQLITE_HEADER
+                        
+                        return length
+                    
+                    # 多线程并行解密，每个线程复用各自的批缓冲区 (update_into 需要额外一个分组的空间)，
+                    # 每轮完成后按顺序写出
+                    buffers = [bytearray(batch_size + IV_SIZE) for _ in range(workers)]
+                    batch_starts = range(0, data_size, batch_size)
+                    
+                    with ThreadPoolExecutor(max_workers=workers) as executor:
+                        for i in range(0, len(batch_starts), workers):
+                            lengths = list(executor.map(decrypt_batch, batch_starts[i:i + workers], buffers))
+                            
+                            # 密钥错误时首页文件头是乱码，直接放弃
+                            if i == 0 and buffers[0][21:24] != SQLITE_HEADER_FRACTIONS:
+                                valid = False
+                                break
+                            
+                            # 写入解密后的数据
+                            for batch, length in zip(buffers, lengths):
+                                f_out.write(memoryview(batch)[:length])
         
-        # 验证是否是有效的SQLite数据库
-        try:
-            conn = sqlite3.connect(str(output_path))
-            conn.execute("SELECT count(*) FROM sqlite_master")
-            conn.close()
-            return output_path
-        except:
+        if not valid:
             os.remove(output_path)
             return None
+        return output_path
             
     except Exception as e:
         print_error(f"解密失败: {e}")
         return None
 
-def extract_messages(db_path: Path) -> List[Dict[str, Any]]:
-    """从解密的数据库中提取消息"""
+def open_decrypted_db(db_path: Path) -> sqlite3.Connection:
+    """打开解密后的数据库并应用读取参数"""
+    conn = sqlite3.connect(str(db_path))
+    for pragma in READ_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def fetch_rows(cursor, sql: str, rows_out: List[Tuple]):
+    """执行查询并分批读取全部结果"""
+    cursor.execute(sql)
+    while True:
+        rows = cursor.fetchmany()
+        if not rows:
+            break
+        rows_out.extend(rows)
+
+def extract_messages(db_path: Path) -> List[Tuple]:
+    """从解密的数据库中提取 (content, timestamp, sender, type, isSend) 元组，时间戳已换算为毫秒"""
     messages = []
     
     try:
-        conn = sqlite3.connect(str(db_path))
-        conn.row_factory = sqlite3.Row
+        conn = open_decrypted_db(db_path)
         cursor = conn.cursor()
+        cursor.arraysize = FETCH_BATCH_SIZE
         
         # 获取所有表名
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
@@ -315,21 +406,26 @@ def extract_messages(db_path: Path) -> List[Dict[str, Any]]:
         # 查找消息表
         msg_tables = [t for t in tables if 'MSG' in t.upper()]
         
-        for table in msg_tables:
+        selects = [
+            f"SELECT StrContent, IFNULL(CreateTime, 0) * 1000 AS CreateTime, StrTalker, Type, IsSend FROM {table} WHERE StrContent != ''"
+            for table in msg_tables
+        ]
+        
+        # 用 UNION ALL 合并各分表查询，每条语句不超过 SQLite 的复合查询上限
+        for i in range(0, len(selects), MAX_UNION_SELECTS):
+            batch = selects[i:i + MAX_UNION_SELECTS]
+            start = len(messages)
             try:
-                cursor.execute(f"SELECT StrContent, CreateTime, StrTalker, Type, IsSend FROM {table}")
-                
-                for row in cursor.fetchall():
-                    if row[0]:  # 有内容
-                        messages.append({
-                            'content': row[0],
-                            'timestamp': row[1],
-                            'sender': row[2],
-                            'type': row[3],
-                            'isSelf': row[4] == 1
-                        })
+                fetch_rows(cursor, " UNION ALL ".join(batch) + " ORDER BY CreateTime", messages)
             except Exception:
-                continue
+                # 有表缺少消息字段时整条语句失败，退回逐表查询并跳过出错的表
+                del messages[start:]
+                for select in batch:
+                    start = len(messages)
+                    try:
+                        fetch_rows(cursor, select + " ORDER BY CreateTime", messages)
+                    except Exception:
+                        del messages[start:]
         
         conn.close()
     except Exception as e:
@@ -342,7 +438,7 @@ def extract_contacts(db_path: Path) -> Dict[str, str]:
     contacts = {}
     
     try:
-        conn = sqlite3.connect(str(db_path))
+        conn = open_decrypted_db(db_path)
         cursor = conn.cursor()
         
         try:
@@ -359,60 +455,79 @@ def extract_contacts(db_path: Path) -> Dict[str, str]:
     
     return contacts
 
-def export_to_json(messages: List[Dict], contacts: Dict, output_path: Path) -> Tuple[int, int]:
+def process_database(db_path: Path, derived_key: bytes, output_dir: Path, workers: int) -> Optional[Tuple[Path, Dict[str, str], List[Tuple]]]:
+    """解密单个数据库并提取联系人或消息，解密失败时返回None"""
+    decrypted_path = decrypt_database(db_path, derived_key, output_dir, workers)
+    if not decrypted_path:
+        return None
+    
+    # 提取数据
+    if 'MicroMsg' in db_path.name:
+        return decrypted_path, extract_contacts(decrypted_path), []
+    return decrypted_path, {}, extract_messages(decrypted_path)
+
+# 消息类型代码到导出类型的映射
+MESSAGE_TYPES = {
+    1: 'text',
+    3: 'image',
+    34: 'voice',
+    43: 'video',
+    47: 'emoji',
+    49: 'file',
+    10000: 'system',
+    10002: 'system'
+}
+
+def export_to_json(messages: List[Tuple], contacts: Dict, output_path: Path) -> Tuple[int, int]:
     """导出为JSON格式"""
+    message_type = MESSAGE_TYPES.get
     # 按会话分组
     sessions = {}
+    contacts_get = contacts.get
     
-    for msg in messages:
-        sender = msg.get('sender', 'unknown')
-        if sender not in sessions:
-            sessions[sender] = {
+    for content, timestamp, sender, type_code, is_send in messages:
+        sender = sender or 'unknown'
+        session = sessions.get(sender)
+        if session is None:
+            session = sessions[sender] = {
                 'id': sender,
-                'name': contacts.get(sender, sender),
+                'name': contacts_get(sender, sender),
                 'messages': [],
                 'isGroup': '@chatroom' in sender
             }
         
-        sessions[sender]['messages'].append({
-            'id': str(len(sessions[sender]['messages'])),
-            'content': msg.get('content', ''),
-            'timestamp': msg.get('timestamp', 0) * 1000 if msg.get('timestamp') else 0,
-            'isSelf': msg.get('isSelf', False),
-            'senderName': '我' if msg.get('isSelf') else contacts.get(sender, sender),
-            'type': get_message_type(msg.get('type', 1))
+        session_messages = session['messages']
+        is_self = is_send == 1
+        session_messages.append({
+            'id': str(len(session_messages)),
+            'content': content,
+            'timestamp': timestamp,
+            'isSelf': is_self,
+            'senderName': '我' if is_self else session['name'],
+            'type': message_type(type_code, 'text')
         })
     
     # 转换为列表并排序
     result = list(sessions.values())
     for session in result:
-        session['messages'].sort(key=lambda x: x['timestamp'])
+        # 各数据库的消息已按时间有序，Timsort 只需合并这些有序段
+        session['messages'].sort(key=itemgetter('timestamp'))
         session['messageCount'] = len(session['messages'])
         if session['messages']:
             session['lastMessage'] = session['messages'][-1]['content'][:50]
             session['lastMessageTime'] = session['messages'][-1]['timestamp']
     
-    result.sort(key=lambda x: x.get('lastMessageTime', 0), reverse=True)
+    result.sort(key=itemgetter('lastMessageTime'), reverse=True)
     
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
+    if ORJSON_AVAILABLE:
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
     
     return len(result), sum(s['messageCount'] for s in result)
 
-def get_message_type(type_code) -> str:
-    """转换消息类型"""
-    type_map = {
-        1: 'text',
-        3: 'image',
-        34: 'voice',
-        43: 'video',
-        47: 'emoji',
-        49: 'file',
-        10000: 'system',
-        10002: 'system'
-    }
-    return type_map.get(type_code, 'text')
-
 def manual_key_input() -> Optional[bytes]:
     """手动输入密钥"""
     print_info("请输入32字节十六进制密钥 (64个字符):")
@@ -483,27 +598,52 @@ def main():
     print_header("解密数据库")
     
     all_messages = []
+    db_messages = {}
     contacts = {}
     decrypted_count = 0
     
+    # 读取各数据库的salt
+    salts = {}
     for db_file in db_files:
-        print_info(f"解密: {db_file.name}")
+        try:
+            salts[db_file] = read_salt(db_file)
+        except OSError as e:
+            print_warning(f"读取失败: {db_file.name} ({e})")
+    
+    # 各数据库相互独立，多进程并行解密并提取
+    # 各进程内的解密线程平分CPU，避免进程数 x 线程数的过度订阅
+    decrypt_workers = max(1, DECRYPT_WORKERS // len(db_files))
+    
+    # 进程数使用默认值 (Windows 上限为 61)
+    with ProcessPoolExecutor() as executor:
+        # 相同salt只派生一次密钥
+        unique_salts = list(set(salts.values()))
+        derived_keys = dict(zip(unique_salts, executor.map(derive_key, repeat(key), unique_salts)))
         
-        decrypted_path = decrypt_database(db_file, key, output_dir)
+        futures = {
+            executor.submit(process_database, db_file, derived_keys[salt], output_dir, decrypt_workers): db_file
+            for db_file, salt in salts.items()
+        }
         
-        if decrypted_path:
-            print_success(f"  -> {decrypted_path.name}")
-            decrypted_count += 1
+        for future in as_completed(futures):
+            db_file = futures[future]
+            result = future.result()
             
-            # 提取数据
-            if 'MicroMsg' in db_file.name:
-                contacts.update(extract_contacts(decrypted_path))
+            if result:
+                decrypted_path, db_contacts, messages = result
+                print_success(f"解密: {db_file.name} -> {decrypted_path.name}")
+                decrypted_count += 1
+                
+                contacts.update(db_contacts)
+                if 'MicroMsg' not in db_file.name:
+                    db_messages[db_file] = messages
+                    print_info(f"    提取 {len(messages)} 条消息")
             else:
-                messages = extract_messages(decrypted_path)
-                all_messages.extend(messages)
-                print_info(f"    提取 {len(messages)} 条消息")
-        else:
-            print_warning(f"  解密失败")
+                print_warning(f"解密失败: {db_file.name}")
+    
+    # 按数据库顺序合并，使导出结果与完成顺序无关
+    for db_file in db_files:
+        all_messages.extend(db_messages.get(db_file, []))
     
     print()
     print_success(f"成功解密 {decrypted_count}/{len(db_files)} 个数据库")